@@ -1,11 +1,15 @@
 import asyncio
 import logging
-from typing import Dict, List
+import time
+from typing import Dict
 from .sdk.seven_ma_sdk import SevenPaceAsyncClient, APIError
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 全局并发上限：同时运行的预约任务不超过该数量，超出的任务排队等待
+reservation_semaphore = asyncio.Semaphore(20)
+
 class ReservationTask:
     def __init__(self, token: str, user_id: str, car_number: str, max_loops: int = 10):
         self.token = token
@@ -15,9 +19,43 @@ class ReservationTask:
         self.current_loop = 0
         self.status = "pending"
         self.message = "任务已创建，等待开始"
+        self.finished_at: float | None = None
         self._stop_event = asyncio.Event()
 
+    async def _sleep_or_stop(self, seconds: float) -> bool:
+        """
+        挂起等待 seconds 秒，期间如果收到停止信号则立即返回。
+        返回 True 表示任务被要求停止，False 表示等待正常结束。
+        """
+        try:
+            await asyncio.wait_for(self._stop_event.wait(), timeout=seconds)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _report_wait_progress(self, total_seconds: int):
+        """每分钟更新一次等待剩余时间的消息，供前端展示。"""
+        remaining = total_seconds
+        while remaining > 0:
+            remaining_minutes = (remaining + 59) // 60  # 向上取整
+            self.message = f"第 {self.current_loop} 轮: 等待 {remaining_minutes} 分钟后主动还车..."
+            await asyncio.sleep(60)
+            remaining -= 60
+
     async def run(self):
+        try:
+            # 信号量限制同时运行的预约任务数，防止单用户无限制地占用内存和连接
+            async with reservation_semaphore:
+                await self._run()
+        finally:
+            # 任务结束（或取消）后从活跃索引中移除，历史记录仍保留在 task_manager
+            user_tasks = active_tasks.get(self.user_id)
+            if user_tasks and user_tasks.get(self.car_number) is self:
+                del user_tasks[self.car_number]
+                if not user_tasks:
+                    del active_tasks[self.user_id]
+
+    async def _run(self):
         self.status = "running"
         self.message = "任务正在运行"
         logger.info(f"Task for user {self.user_id} on car {self.car_number} started.")
@@ -38,50 +76,40 @@ class ReservationTask:
                     logger.info(f"User {self.user_id}, Car {self.car_number}: Ordered successfully.")
 
                     # 2. 等待24分钟 (1440秒)，然后主动还车以避免收费
+                    # 使用停止事件挂起等待，避免每秒轮询唤醒事件循环
                     wait_seconds = 24 * 60
-                    for i in range(wait_seconds, 0, -1):
-                        if self._stop_event.is_set():
-                            break
-                        
-                        # 每分钟更新一次消息
-                        if i % 60 == 0 or i == wait_seconds:
-                            remaining_minutes = (i + 59) // 60 # 向上取整
-                            self.message = f"第 {self.current_loop} 轮: 等待 {remaining_minutes} 分钟后主动还车..."
-                        
-                        await asyncio.sleep(1)
-
-                    if self._stop_event.is_set():
+                    progress_task = asyncio.create_task(self._report_wait_progress(wait_seconds))
+                    try:
+                        stopped = await self._sleep_or_stop(wait_seconds)
+                    finally:
+                        progress_task.cancel()
+
+                    if stopped:
                         break
 
-                    # 3. 主动还车，并加入重试机制以确保成功
-                    return_successful = False
+                    # 3. 主动还车，重试策略由 SDK 统一处理（复用同一连接/会话）
                     max_retries = 12 # 重试12次，大约3分钟
-                    for i in range(max_retries):
+                    try:
+                        self.message = f"第 {self.current_loop} 轮: 正在主动还车 (最多尝试 {max_retries} 次)..."
+                        await client.back_car_with_retry(
+                            max_retries=max_retries, backoff=15, stop_event=self._stop_event
+                        )
+                        self.message = f"第 {self.current_loop} 轮: 已主动还车，准备下一轮。"
+                        logger.info(f"User {self.user_id}, Car {self.car_number}: Manually returned car successfully.")
+                        await asyncio.sleep(5) # 等待操作生效
+                    except APIError as e:
                         if self._stop_event.is_set():
-                            break
-                        try:
-                            self.message = f"第 {self.current_loop} 轮: 正在主动还车 (尝试 {i + 1}/{max_retries})..."
-                            await client.back_car()
-                            return_successful = True
-                            self.message = f"第 {self.current_loop} 轮: 已主动还车，准备下一轮。"
-                            logger.info(f"User {self.user_id}, Car {self.car_number}: Manually returned car successfully.")
-                            await asyncio.sleep(5) # 等待操作生效
-                            break # 还车成功，跳出重试循环
-                        except APIError as e:
-                            self.message = f"第 {self.current_loop} 轮: 还车失败({e})。15秒后重试..."
-                            logger.error(f"User {self.user_id}, Car {self.car_number}: Failed to return car (attempt {i + 1}): {e}")
-                            await asyncio.sleep(15)
-                    
-                    if not return_successful:
+                            break # 重试期间收到停止信号
                         self.message = "多次还车失败，任务已终止以避免风险。"
-                        logger.critical(f"User {self.user_id}, Car {self.car_number}: Failed to return car after {max_retries} retries. Task is stopping.")
+                        logger.critical(f"User {self.user_id}, Car {self.car_number}: Failed to return car after {max_retries} retries: {e}. Task is stopping.")
                         break # 关键：如果多次还车失败，必须终止整个任务
 
                 except APIError as e:
                     self.message = f"第 {self.current_loop} 轮预约出错: {e}"
                     logger.error(f"User {self.user_id}, Car {self.car_number}: APIError in loop {self.current_loop}: {e}")
                     # 如果是预约失败（例如车辆被占用），则等待一段时间再试
-                    await asyncio.sleep(60)
+                    if await self._sleep_or_stop(60):
+                        break
                     continue # 继续下一次循环尝试
                 except Exception as e:
                     self.message = f"第 {self.current_loop} 轮发生未知错误: {e}"
@@ -102,6 +130,7 @@ class ReservationTask:
             if self.status not in ["completed", "stopped"]:
                 self.status = "failed"
                 logger.error(f"Task for user {self.user_id} on car {self.car_number} failed unexpectedly.")
+            self.finished_at = time.monotonic()
 
 
     def stop(self):
@@ -119,5 +148,48 @@ class ReservationTask:
         }
 
 # 全局任务管理器
-# 结构: { "user_id": [Task1, Task2, ...] }
-task_manager: Dict[str, List[ReservationTask]] = {}
+# 结构: { "user_id": { "car_number": Task } }，按车辆编号索引，查找为 O(1)
+task_manager: Dict[str, Dict[str, ReservationTask]] = {}
+
+# 活跃任务索引：只包含 pending/running 的任务，查找时无需过滤历史记录
+# 结构与 task_manager 相同，但条目在任务结束时即被移除
+active_tasks: Dict[str, Dict[str, ReservationTask]] = {}
+
+# 正在运行的 asyncio.Task 句柄，供应用关闭时统一等待，避免预约悬挂（车辆未归还）
+running_tasks: set[asyncio.Task] = set()
+
+def start_reservation_task(task: ReservationTask) -> asyncio.Task:
+    """启动预约任务并登记其句柄，任务结束后自动注销。"""
+    # 同步写入活跃索引，确保紧随其后的重复创建检查能立即看到该任务
+    active_tasks.setdefault(task.user_id, {})[task.car_number] = task
+    handle = asyncio.create_task(task.run())
+    running_tasks.add(handle)
+    handle.add_done_callback(running_tasks.discard)
+    return handle
+
+async def shutdown_all_tasks(timeout: float = 30):
+    """
+    应用关闭时调用：向所有任务发送停止信号并等待它们退出，
+    让进行中的循环有机会主动还车，而不是直接被销毁。
+    """
+    for user_tasks in task_manager.values():
+        for task in user_tasks.values():
+            task.stop()
+    if running_tasks:
+        done, pending = await asyncio.wait(running_tasks, timeout=timeout)
+        if pending:
+            logger.error("%d reservation task(s) did not stop within %ss.", len(pending), timeout)
+
+def purge_finished_tasks(max_age_seconds: int = 3600):
+    """清理已结束且超过保留时间的任务，避免任务记录无限累积。"""
+    now = time.monotonic()
+    for user_id in list(task_manager):
+        user_tasks = task_manager[user_id]
+        for car_number in list(user_tasks):
+            task = user_tasks[car_number]
+            if (task.status in ["completed", "stopped", "failed"]
+                    and task.finished_at is not None
+                    and now - task.finished_at > max_age_seconds):
+                del user_tasks[car_number]
+        if not user_tasks:
+            del task_manager[user_id]
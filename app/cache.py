@@ -1,15 +1,23 @@
+import asyncio
 import time
-from typing import Any, Dict, Tuple, Optional
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional
+
+class CacheEntry(NamedTuple):
+    value: Any
+    expiry_time: float
+
 class SimpleCache:
     """
     一个简单的内存缓存实现，带有 TTL (Time-To-Live)。
+    过期时间基于 time.monotonic()，不受系统时钟跳变（如 NTP 校时）影响。
     """
     def __init__(self, default_ttl: int = 300):
         """
         初始化缓存。
         :param default_ttl: 默认的缓存过期时间（秒）。
         """
-        self._cache: Dict[str, Tuple[Any, float]] = {}
+        self._cache: Dict[str, CacheEntry] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
         self.default_ttl = default_ttl
 
     def get(self, key: str) -> Any:
@@ -17,10 +25,10 @@ class SimpleCache:
         根据 key 从缓存中获取数据。
         如果 key 不存在或数据已过期，则返回 None。
         """
-        if key in self._cache:
-            value, expiry_time = self._cache[key]
-            if time.time() < expiry_time:
-                return value
+        entry = self._cache.get(key)
+        if entry is not None:
+            if time.monotonic() < entry.expiry_time:
+                return entry.value
             else:
                 # 缓存过期，删除
                 del self._cache[key]
@@ -35,8 +43,45 @@ class SimpleCache:
         """
         if ttl is None:
             ttl = self.default_ttl
-        expiry_time = time.time() + ttl
-        self._cache[key] = (value, expiry_time)
+        self._cache[key] = CacheEntry(value, time.monotonic() + ttl)
+
+    async def get_or_set(self, key: str, factory: Callable[[], Awaitable[Any]],
+                         ttl: Optional[int] = None) -> Any:
+        """
+        获取缓存值；未命中时调用 factory 获取并写入缓存。
+        通过按 key 加锁保证并发未命中时只有一个协程真正执行 factory，
+        其余协程等待后直接复用结果（避免缓存击穿）。
+        :param factory: 无参数的异步函数，用于在未命中时获取数据。
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            try:
+                # 拿到锁后再检查一次，可能已被先拿到锁的协程填充
+                value = self.get(key)
+                if value is None:
+                    value = await factory()
+                    self.set(key, value, ttl)
+            finally:
+                # 无论填充成功还是 factory 抛出异常都移除锁条目，
+                # 否则无效 token 的反复请求会让锁表无限增长；
+                # 等待中的协程仍持有引用，可安全移除
+                self._locks.pop(key, None)
+        return value
+
+    def sweep(self):
+        """
+        一次性清除所有已过期的条目。
+        get 只在访问时惰性删除，不再被查询的 token 会一直留在缓存中，
+        需要定期调用本方法来保证内存有界。
+        """
+        now = time.monotonic()
+        self._cache = {k: v for k, v in self._cache.items() if v.expiry_time > now}
+        # 同步清掉没有对应缓存条目的遗留锁，保证锁表同样有界
+        self._locks = {k: v for k, v in self._locks.items() if k in self._cache or v.locked()}
 
     def clear(self):
         """
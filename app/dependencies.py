@@ -1,3 +1,4 @@
+from dataclasses import dataclass, field
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from .sdk.seven_ma_sdk import SevenPaceAsyncClient, AuthenticationError, UserInfo
@@ -5,29 +6,52 @@ from .cache import user_info_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token") # tokenUrl is not used directly, but required
 
-async def get_authenticated_client(token: str = Depends(oauth2_scheme)) -> SevenPaceAsyncClient:
+@dataclass
+class AuthContext:
     """
-    Dependency to get an authenticated SevenPaceAsyncClient.
-    It uses a cache to avoid excessive calls to get_user_info.
+    单次请求的认证上下文：已获取的用户信息和原始 token。
+    SevenPaceAsyncClient 按需懒构造——缓存命中且端点只读 user_info 时，
+    整个请求都不会创建客户端。
     """
-    client = SevenPaceAsyncClient()
-    client.set_token(token)
-
-    # 尝试从缓存中获取用户信息
-    cached_user_info = user_info_cache.get(token)
-    if cached_user_info:
-        # 如果缓存命中，我们可以通过重写 get_user_info 方法来避免实际的 API 调用
-        async def cached_get_user_info(*args, **kwargs) -> UserInfo:
-            return cached_user_info
-        client.get_user_info = cached_get_user_info # type: ignore
-        return client
-
-    # 如果缓存未命中，则执行实际的 API 调用
+    token: str
+    user_info: UserInfo | None = None
+    _client: SevenPaceAsyncClient | None = field(default=None, repr=False)
+
+    @property
+    def client(self) -> SevenPaceAsyncClient:
+        if self._client is None:
+            client = SevenPaceAsyncClient()
+            client.set_token(self.token)
+
+            # 重写 get_user_info，让端点内的无参调用直接复用已缓存的用户信息；
+            # 带参数的调用（如 need_credits=True）要的数据缓存里没有，走真实请求
+            real_get_user_info = client.get_user_info
+            async def cached_get_user_info(*args, **kwargs) -> UserInfo:
+                if args or kwargs:
+                    return await real_get_user_info(*args, **kwargs)
+                if self.user_info is not None:
+                    return self.user_info
+                return await real_get_user_info()
+            client.get_user_info = cached_get_user_info # type: ignore
+            self._client = client
+        return self._client
+
+async def get_auth_context(token: str = Depends(oauth2_scheme)) -> AuthContext:
+    """
+    Dependency to get the authenticated context for the current request.
+    It uses a cache to avoid excessive calls to get_user_info, and exposes
+    the fetched UserInfo so endpoints don't have to request it again.
+    """
+    ctx = AuthContext(token=token)
+
+    async def fetch() -> UserInfo:
+        # 仅在缓存未命中时才会走到这里，此时才真正构造客户端
+        return await ctx.client.get_user_info()
+
     try:
-        user_info = await client.get_user_info()
-        # 将获取到的用户信息存入缓存
-        user_info_cache.set(token, user_info)
-        return client
+        # 未命中时只有一个并发协程会真正调用 get_user_info，其余等待复用结果
+        ctx.user_info = await user_info_cache.get_or_set(token, fetch)
+        return ctx
     except (AuthenticationError, Exception) as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -35,7 +59,12 @@ async def get_authenticated_client(token: str = Depends(oauth2_scheme)) -> Seven
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-# Note: The client returned by this dependency is not closed automatically.
-# We need to handle its lifecycle within the endpoint or using another dependency.
-# For simplicity in this project, we will rely on the endpoint to close it,
-# or let the garbage collector handle it as each request creates a new client.
+async def get_authenticated_client(ctx: AuthContext = Depends(get_auth_context)) -> SevenPaceAsyncClient:
+    """
+    向后兼容的依赖：只需要客户端本身的端点继续使用它。
+    """
+    return ctx.client
+
+# Note: The client built by these dependencies uses the SDK's shared
+# httpx.AsyncClient pool, so endpoints must NOT close it; the pool is closed
+# once on application shutdown via close_shared_client().
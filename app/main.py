@@ -1,33 +1,55 @@
+import asyncio
+import os
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from starlette.responses import FileResponse
+from .background import shutdown_all_tasks
+from .cache import user_info_cache
 from .scheduler import scheduler_manager
+from .sdk.seven_ma_sdk import close_shared_client
+
+async def _cache_sweeper():
+    """定期清除用户信息缓存中已过期的条目，保证内存有界。"""
+    while True:
+        await asyncio.sleep(60)
+        user_info_cache.sweep()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    sweeper_task = asyncio.create_task(_cache_sweeper())
     scheduler_manager.start()
     yield
     # Shutdown
     scheduler_manager.shutdown()
+    # 通知所有后台预约任务停止并等待其退出（进行中的循环会先主动还车）
+    await shutdown_all_tasks()
+    sweeper_task.cancel()
+    # SDK 级共享连接池在此统一关闭
+    await close_shared_client()
 
 app = FastAPI(
     title="7ma-web API",
     description="An unofficial web API for 7mate.",
     version="0.1.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # In production, you should restrict this to your frontend's domain
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# 部署在剥离 CORS 的反向代理之后时可设置 ENABLE_CORS=0 跳过该中间件；
+# 启用时通过 CORS_ORIGINS（逗号分隔）给出具体来源，精确匹配比通配符更快
+if os.getenv("ENABLE_CORS", "1") == "1":
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=[o.strip() for o in os.getenv("CORS_ORIGINS", "*").split(",")],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
 
 from .routers import auth, user, car, order, tasks, periodic
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
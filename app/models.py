@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 class PhoneRequest(BaseModel):
     phone: str = Field(..., description="用户手机号")
@@ -27,6 +27,9 @@ class PayRequest(BaseModel):
 from typing import Optional
 
 class PeriodicTaskCreate(BaseModel):
+    # 请求模型在校验后不再被修改，冻结后可安全地复用/缓存其序列化结果
+    model_config = ConfigDict(frozen=True)
+
     name: str = Field(..., description="任务名称")
     cron: str = Field(..., description="CRON表达式, e.g., '0 8 * * 1-5'")
     latitude: float = Field(..., description="目标区域纬度")
@@ -15,8 +15,6 @@ async def get_sms_code(request: models.PhoneRequest):
         return models.MessageResponse(message=message)
     except APIError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        await client.close()
 
 @router.post("/login", response_model=models.TokenResponse)
 async def login(request: models.LoginRequest):
@@ -26,12 +24,9 @@ async def login(request: models.LoginRequest):
     client = SevenPaceAsyncClient()
     try:
         await client.login(request.phone, request.code)
-        token = client.headers.get("authorization", "").replace("Bearer ", "")
-        return models.TokenResponse(token=token, expired_at=client.expired_at)
+        return models.TokenResponse(token=client.token or "", expired_at=client.expired_at)
     except APIError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        await client.close()
 
 @router.post("/token_login", response_model=models.MessageResponse)
 async def token_login(request: models.TokenRequest):
@@ -46,5 +41,3 @@ async def token_login(request: models.TokenRequest):
         return models.MessageResponse(message="Token is valid")
     except Exception as e:
         raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
-    finally:
-        await client.close()
@@ -5,7 +5,7 @@ from ..dependencies import get_authenticated_client
 
 router = APIRouter()
 
-@router.get("/surrounding", response_model=List[dict])
+@router.get("/surrounding", response_model=List[CarInfo])
 async def get_surrounding_cars(
     latitude: float = Query(..., description="纬度"),
     longitude: float = Query(..., description="经度"),
@@ -15,14 +15,11 @@ async def get_surrounding_cars(
     获取周围的车辆
     """
     try:
-        cars = await client.get_surrounding_cars(longitude, latitude)
-        return [dict(car) for car in cars]
+        return await client.get_surrounding_cars(longitude, latitude)
     except APIError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        await client.close()
 
-@router.get("/{car_number}", response_model=dict)
+@router.get("/{car_number}", response_model=CarInfo)
 async def get_car_info(
     car_number: str,
     client: SevenPaceAsyncClient = Depends(get_authenticated_client)
@@ -31,9 +28,6 @@ async def get_car_info(
     获取车辆详细信息
     """
     try:
-        car_info = await client.get_car_info(car_number)
-        return dict(car_info)
+        return await client.get_car_info(car_number)
     except APIError as e:
         raise HTTPException(status_code=404, detail=str(e))
-    finally:
-        await client.close()
@@ -18,8 +18,6 @@ async def create_order(
         return models.MessageResponse(message=message)
     except APIError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        await client.close()
 
 @router.get("/current", response_model=dict)
 async def get_current_order(client: SevenPaceAsyncClient = Depends(get_authenticated_client)):
@@ -32,8 +30,6 @@ async def get_current_order(client: SevenPaceAsyncClient = Depends(get_authentic
     except APIError as e:
         # It's common to have no current order, so we return 404
         raise HTTPException(status_code=404, detail=str(e))
-    finally:
-        await client.close()
 
 @router.post("/actions/unlock", response_model=models.MessageResponse)
 async def unlock_car(client: SevenPaceAsyncClient = Depends(get_authenticated_client)):
@@ -46,6 +42,7 @@ async def unlock_car(client: SevenPaceAsyncClient = Depends(get_authenticated_cl
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to send unlock command: {e}")
     finally:
+        # 请求级客户端不会被复用，关闭其持有的 WebSocket 连接
         await client.close()
 
 @router.post("/actions/lock", response_model=models.MessageResponse)
@@ -59,6 +56,7 @@ async def temporary_lock_car(client: SevenPaceAsyncClient = Depends(get_authenti
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to send lock command: {e}")
     finally:
+        # 请求级客户端不会被复用，关闭其持有的 WebSocket 连接
         await client.close()
 
 @router.post("/actions/return", response_model=models.MessageResponse)
@@ -71,8 +69,6 @@ async def return_car(client: SevenPaceAsyncClient = Depends(get_authenticated_cl
         return models.MessageResponse(message=f"Return car command sent: {cmd}")
     except APIError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        await client.close()
 
 @router.post("/pay", response_model=models.MessageResponse)
 async def pay_order(
@@ -87,8 +83,6 @@ async def pay_order(
         return models.MessageResponse(message=message)
     except APIError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        await client.close()
 
 @router.post("/signin", response_model=models.MessageResponse)
 async def signin(client: SevenPaceAsyncClient = Depends(get_authenticated_client)):
@@ -100,8 +94,6 @@ async def signin(client: SevenPaceAsyncClient = Depends(get_authenticated_client
         return models.MessageResponse(message=message)
     except APIError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        await client.close()
 
 @router.get("/unpaid", response_model=dict)
 async def get_unpaid_order(client: SevenPaceAsyncClient = Depends(get_authenticated_client)):
@@ -115,8 +107,6 @@ async def get_unpaid_order(client: SevenPaceAsyncClient = Depends(get_authentica
         raise HTTPException(status_code=404, detail="No unpaid order found")
     except APIError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        await client.close()
 
 @router.post("/pay_unpaid", response_model=models.MessageResponse)
 async def pay_unpaid_order(client: SevenPaceAsyncClient = Depends(get_authenticated_client)):
@@ -132,5 +122,3 @@ async def pay_unpaid_order(client: SevenPaceAsyncClient = Depends(get_authentica
         return models.MessageResponse(message=message)
     except APIError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        await client.close()
@@ -1,7 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
 from typing import List, Dict, Any
-from ..dependencies import get_authenticated_client
-from ..sdk.seven_ma_sdk import SevenPaceAsyncClient
+from ..dependencies import AuthContext, get_auth_context
 from .. import models
 from ..scheduler import scheduler_manager
 
@@ -10,18 +9,14 @@ router = APIRouter()
 @router.post("", response_model=Dict[str, Any])
 async def create_periodic_task(
     request: models.PeriodicTaskCreate,
-    client: SevenPaceAsyncClient = Depends(get_authenticated_client)
+    ctx: AuthContext = Depends(get_auth_context)
 ):
     """
     创建一个新的周期性任务
     """
-    user_info = await client.get_user_info()
-    user_id = str(user_info.id)
-    token = client.headers.get("authorization", "").replace("Bearer ", "")
-
-    task_config = request.dict()
-    task_config["user_id"] = user_id
-    task_config["token"] = token
+    task_config = request.model_dump()
+    task_config["user_id"] = str(ctx.user_info.id)
+    task_config["token"] = ctx.token
 
     try:
         new_task = scheduler_manager.add_task(task_config)
@@ -30,32 +25,26 @@ async def create_periodic_task(
         raise HTTPException(status_code=400, detail=f"创建任务失败: {e}")
 
 @router.get("", response_model=List[Dict[str, Any]])
-async def get_periodic_tasks(client: SevenPaceAsyncClient = Depends(get_authenticated_client)):
+async def get_periodic_tasks(ctx: AuthContext = Depends(get_auth_context)):
     """
     获取当前用户的所有周期性任务
     """
-    user_info = await client.get_user_info()
-    user_id = str(user_info.id)
-    return scheduler_manager.get_tasks_for_user(user_id)
+    return scheduler_manager.get_tasks_for_user(str(ctx.user_info.id))
 
 @router.put("/{task_id}", response_model=Dict[str, Any])
 async def update_periodic_task(
     task_id: str,
     request: models.PeriodicTaskCreate,
-    client: SevenPaceAsyncClient = Depends(get_authenticated_client)
+    ctx: AuthContext = Depends(get_auth_context)
 ):
     """
     更新一个现有的周期性任务
     """
-    user_info = await client.get_user_info()
-    user_id = str(user_info.id)
-    token = client.headers.get("authorization", "").replace("Bearer ", "")
-
-    updates = request.dict()
-    updates["token"] = token # 强制使用最新的token
+    updates = request.model_dump()
+    updates["token"] = ctx.token # 强制使用最新的token
 
     try:
-        updated_task = scheduler_manager.update_task(task_id, user_id, updates)
+        updated_task = scheduler_manager.update_task(task_id, str(ctx.user_info.id), updates)
         return updated_task
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -65,15 +54,13 @@ async def update_periodic_task(
 @router.delete("/{task_id}", response_model=models.MessageResponse)
 async def delete_periodic_task(
     task_id: str,
-    client: SevenPaceAsyncClient = Depends(get_authenticated_client)
+    ctx: AuthContext = Depends(get_auth_context)
 ):
     """
     删除一个周期性任务
     """
-    user_info = await client.get_user_info()
-    user_id = str(user_info.id)
     try:
-        scheduler_manager.remove_task(task_id, user_id)
+        scheduler_manager.remove_task(task_id, str(ctx.user_info.id))
         return models.MessageResponse(message="任务已删除")
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -9,8 +9,5 @@ async def get_user_info(client: SevenPaceAsyncClient = Depends(get_authenticated
     """
     获取当前登录用户的信息
     """
-    try:
-        user_info = await client.get_user_info(need_credits=True)
-        return dict(user_info)
-    finally:
-        await client.close()
+    user_info = await client.get_user_info(need_credits=True)
+    return dict(user_info)
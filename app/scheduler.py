@@ -1,36 +1,141 @@
 import asyncio
 import json
 import logging
+import mmap
+import os
 import random
+import time
 import uuid
+from functools import lru_cache
 from datetime import datetime
 from typing import List, Dict, Any
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from app.sdk.seven_ma_sdk import SevenPaceAsyncClient, APIError
-from app.background import ReservationTask, task_manager
+from app.background import ReservationTask, active_tasks, task_manager, purge_finished_tasks, start_reservation_task
+
+# orjson 的序列化/解析开销远低于标准库，未安装时自动退回 json
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 TASKS_FILE = "periodic_tasks.json"
+TASKS_LOG_FILE = "periodic_tasks.log"
+# 快照超过该大小时用 mmap 读取，避免把整个文件复制进 Python 缓冲区
+MMAP_THRESHOLD = 1024 * 1024
+
+async def _purge_finished_reservations_job():
+    # async 外壳让 APScheduler 在事件循环上执行清理；
+    # task_manager 同时被请求处理和关闭流程遍历，必须保持单线程修改
+    purge_finished_tasks()
+
+def _pct(s: str) -> int:
+    """解析 "95%" 这类电量字符串；切片去掉百分号，不做整串 replace 拷贝。"""
+    return int(s[:-1]) if s.endswith('%') else int(s)
+
+@lru_cache(maxsize=512)
+def _parse_cron(cron_str: str) -> CronTrigger:
+    """解析 CRON 表达式并按字符串缓存，避免重复解析同一表达式。"""
+    return CronTrigger.from_crontab(cron_str)
 
 class PeriodicTaskManager:
     def __init__(self):
         self.scheduler = AsyncIOScheduler()
         self.tasks: List[Dict[str, Any]] = []
+        # 按 id / user_id 的索引，避免每次查找都线性扫描 self.tasks
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._by_user: Dict[str, List[Dict[str, Any]]] = {}
+        self._journal_entries = 0
         self._load_tasks_from_file()
 
     def _load_tasks_from_file(self):
         try:
-            with open(TASKS_FILE, "r") as f:
-                self.tasks = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
+            with open(TASKS_FILE, "rb") as f:
+                if os.path.getsize(TASKS_FILE) > MMAP_THRESHOLD:
+                    # 大文件直接映射进地址空间解析，省掉一次完整拷贝
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        if orjson:
+                            view = memoryview(mm)
+                            try:
+                                self.tasks = orjson.loads(view)
+                            finally:
+                                view.release()
+                        else:
+                            self.tasks = json.loads(mm[:])
+                else:
+                    raw = f.read()
+                    self.tasks = orjson.loads(raw) if orjson else json.loads(raw)
+        except (FileNotFoundError, ValueError):
             self.tasks = []
+        self._rebuild_indexes()
+        self._replay_status_log()
+
+    def _rebuild_indexes(self):
+        self._by_id = {task["id"]: task for task in self.tasks}
+        self._by_user = {}
+        for task in self.tasks:
+            self._by_user.setdefault(task.get("user_id"), []).append(task)
+
+    def _replay_status_log(self):
+        """把追加日志中的状态更新合并回快照数据（覆盖崩溃前未落快照的部分）。"""
+        try:
+            with open(TASKS_LOG_FILE, "rb") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = orjson.loads(line) if orjson else json.loads(line)
+            except ValueError:
+                continue
+            task = self._by_id.get(entry.get("id"))
+            if task:
+                task["last_run_time"] = entry.get("last_run_time")
+                task["last_run_status"] = entry.get("last_run_status")
+                # 计入待合并条目，下次 flush 时把重放的状态落进快照并清空日志
+                self._journal_entries += 1
 
     def _save_tasks_to_file(self):
-        with open(TASKS_FILE, "w") as f:
-            json.dump(self.tasks, f, indent=4)
+        # 先写临时文件再原子替换，写快照期间崩溃不会损坏原文件
+        tmp_file = TASKS_FILE + ".tmp"
+        with open(tmp_file, "wb") as f:
+            if orjson:
+                f.write(orjson.dumps(self.tasks, option=orjson.OPT_INDENT_2))
+            else:
+                f.write(json.dumps(self.tasks, indent=4).encode("utf-8"))
+        os.replace(tmp_file, TASKS_FILE)
+        # 快照已包含全部状态，清空追加日志
+        open(TASKS_LOG_FILE, "w").close()
+        self._journal_entries = 0
+
+    def _append_status_update(self, task: Dict[str, Any]):
+        """状态更新只追加一行日志，不再在每次任务执行后重写整个快照。"""
+        entry = {
+            "id": task["id"],
+            "last_run_time": task["last_run_time"],
+            "last_run_status": task["last_run_status"],
+        }
+        line = orjson.dumps(entry) if orjson else json.dumps(entry).encode("utf-8")
+        with open(TASKS_LOG_FILE, "ab") as f:
+            f.write(line + b"\n")
+        self._journal_entries += 1
+
+    def _flush_journal(self):
+        """把累积的状态日志合并进快照；由定时任务和关闭流程调用。"""
+        if self._journal_entries:
+            self._save_tasks_to_file()
+
+    async def _flush_journal_job(self):
+        # async 外壳让 APScheduler 在事件循环上执行，而不是线程池：
+        # 快照/日志与 _execute_task 的写入保持单线程，不会互相竞争
+        self._flush_journal()
 
     async def _execute_task(self, task_config: Dict[str, Any]):
         logger.info(f"Executing periodic task: {task_config.get('name', task_config['id'])}")
@@ -38,41 +143,64 @@ class PeriodicTaskManager:
         status = "Failed: Unknown error"
         try:
             client.set_token(task_config["token"])
+            # Token 已过期的任务注定失败，直接短路，省掉一次网络往返
+            if client.expired_at_ts and client.expired_at_ts < time.time():
+                status = "Failed: Token expired"
+                logger.warning(f"Periodic task {task_config.get('id')} skipped: token expired at {client.expired_at}")
+                return
             user_info = await client.get_user_info()
             user_id = str(user_info.id)
 
-            # 1. 查找附近车辆
-            surrounding_cars = await client.get_surrounding_cars(
+            # 1. 查找附近车辆，型号过滤下沉到 SDK，不符合的不构造 CarInfo
+            eligible_cars = await client.get_surrounding_cars(
                 longitude=task_config["longitude"],
-                latitude=task_config["latitude"]
+                latitude=task_config["latitude"],
+                carmodel_id=task_config.get("carmodel_id")
             )
 
-            # 2. 筛选符合车辆类型并随机化列表
-            target_car_model_id = task_config.get("carmodel_id")
-            
-            eligible_cars = [
-                car for car in surrounding_cars 
-                if target_car_model_id is None or car.carmodel_id.value == target_car_model_id
-            ]
+            # 2. 随机化列表
             random.shuffle(eligible_cars)
 
-            # 3. 逐一检查电量，找到第一个符合条件的车辆
-            found_car = None
-            for car_summary in eligible_cars:
+            # 3. 并发探测候选车辆电量，找到第一个符合条件的车辆
+            # 每批最多 8 个并发请求，批内按完成顺序处理，命中后取消剩余探测
+            async def probe_car(car_summary):
+                try:
+                    # 筛选只看电量，不需要位置，省掉每辆车一次 location 请求
+                    return await client.get_car_info(car_summary.number, need_location=False)
+                except (APIError, ValueError, AttributeError) as e:
+                    logger.warning(f"Could not process car {car_summary.number}: {e}")
+                    return None
+
+            candidates = [
+                car for car in eligible_cars
                 # 避免为已在处理的车辆创建新任务
-                if user_id in task_manager and any(t.car_number == car_summary.number and t.status in ["pending", "running"] for t in task_manager[user_id]):
-                    continue
-                
+                if not active_tasks.get(user_id, {}).get(car.number)
+            ]
+            found_car = None
+            probe_batch_size = 8
+            for i in range(0, len(candidates), probe_batch_size):
+                probes = [
+                    asyncio.create_task(probe_car(car))
+                    for car in candidates[i:i + probe_batch_size]
+                ]
                 try:
-                    car_details = await client.get_car_info(car_summary.number)
-                    if car_details.electricity:
-                        electricity = int(car_details.electricity.replace('%', ''))
+                    for probe in asyncio.as_completed(probes):
+                        car_details = await probe
+                        if not (car_details and car_details.electricity):
+                            continue
+                        try:
+                            electricity = _pct(car_details.electricity)
+                        except ValueError:
+                            continue
                         if electricity >= task_config["min_electricity"]:
                             found_car = car_details
                             logger.info(f"Found suitable car {found_car.number} with {electricity}% electricity.")
                             break # 找到后立即停止搜索
-                except (APIError, ValueError, AttributeError) as e:
-                    logger.warning(f"Could not process car {car_summary.number}: {e}")
+                finally:
+                    for probe in probes:
+                        probe.cancel()
+                if found_car:
+                    break
             
             # 4. 如果找到合适的车辆，创建后台预约任务
             if found_car:
@@ -82,10 +210,8 @@ class PeriodicTaskManager:
                     car_number=found_car.number,
                     max_loops=task_config.get("max_loops", 10)
                 )
-                if user_id not in task_manager:
-                    task_manager[user_id] = []
-                task_manager[user_id].append(new_task)
-                asyncio.create_task(new_task.run())
+                task_manager.setdefault(user_id, {})[found_car.number] = new_task
+                start_reservation_task(new_task)
                 status = f"Success: Created task for car {found_car.number}"
             else:
                 logger.info("No suitable car found for periodic task.")
@@ -95,39 +221,55 @@ class PeriodicTaskManager:
             logger.error(f"Error executing periodic task {task_config.get('id')}: {e}")
             status = f"Failed: {e}"
         finally:
-            await client.close()
-            # Update and save the task status
-            for task in self.tasks:
-                if task["id"] == task_config["id"]:
-                    task["last_run_time"] = datetime.now().isoformat()
-                    task["last_run_status"] = status
-                    break
-            self._save_tasks_to_file()
+            # Update the task status; persistence goes through the append log
+            task = self._by_id.get(task_config["id"])
+            if task:
+                task["last_run_time"] = datetime.now().isoformat()
+                task["last_run_status"] = status
+                self._append_status_update(task)
 
     def start(self):
         for task_config in self.tasks:
             self.scheduler.add_job(
                 self._execute_task,
-                CronTrigger.from_crontab(task_config["cron"]),
+                _parse_cron(task_config["cron"]),
                 args=[task_config],
                 id=task_config["id"],
                 name=task_config.get("name")
             )
+        # 定期清理已结束的后台预约任务，避免任务记录无限累积
+        self.scheduler.add_job(
+            _purge_finished_reservations_job,
+            "interval",
+            minutes=10,
+            id="_purge_finished_reservations"
+        )
+        # 定期把状态日志合并进快照，控制日志文件大小
+        self.scheduler.add_job(
+            self._flush_journal_job,
+            "interval",
+            minutes=1,
+            id="_flush_task_journal"
+        )
         self.scheduler.start()
         logger.info("Scheduler started with all periodic tasks.")
 
     def shutdown(self):
-        self.scheduler.shutdown()
+        # wait=False: 立即停止触发新任务；进行中的预约任务由 shutdown_all_tasks 统一等待
+        self.scheduler.shutdown(wait=False)
+        self._flush_journal()
         logger.info("Scheduler shut down.")
 
     def add_task(self, task_config: Dict[str, Any]) -> Dict[str, Any]:
         task_id = str(uuid.uuid4())
         task_config["id"] = task_id
         self.tasks.append(task_config)
+        self._by_id[task_id] = task_config
+        self._by_user.setdefault(task_config.get("user_id"), []).append(task_config)
         self._save_tasks_to_file()
         self.scheduler.add_job(
             self._execute_task,
-            CronTrigger.from_crontab(task_config["cron"]),
+            _parse_cron(task_config["cron"]),
             args=[task_config],
             id=task_config["id"],
             name=task_config.get("name")
@@ -136,8 +278,8 @@ class PeriodicTaskManager:
         return task_config
 
     def update_task(self, task_id: str, user_id: str, updates: Dict[str, Any]) -> Dict[str, Any]:
-        task_to_update = next((task for task in self.tasks if task["id"] == task_id and task["user_id"] == user_id), None)
-        if not task_to_update:
+        task_to_update = self._by_id.get(task_id)
+        if not task_to_update or task_to_update.get("user_id") != user_id:
             raise ValueError("Task not found or permission denied")
 
         task_to_update.update(updates)
@@ -145,18 +287,20 @@ class PeriodicTaskManager:
 
         self.scheduler.reschedule_job(
             task_id,
-            trigger=CronTrigger.from_crontab(task_to_update["cron"]),
+            trigger=_parse_cron(task_to_update["cron"]),
             args=[task_to_update]
         )
         logger.info(f"Updated periodic task: {task_id}")
         return task_to_update
 
     def remove_task(self, task_id: str, user_id: str):
-        task_to_remove = next((task for task in self.tasks if task["id"] == task_id and task["user_id"] == user_id), None)
-        if not task_to_remove:
+        task_to_remove = self._by_id.get(task_id)
+        if not task_to_remove or task_to_remove.get("user_id") != user_id:
             raise ValueError("Task not found or permission denied")
-        
+
         self.tasks.remove(task_to_remove)
+        del self._by_id[task_id]
+        self._by_user[user_id].remove(task_to_remove)
         self._save_tasks_to_file()
         try:
             self.scheduler.remove_job(task_id)
@@ -165,7 +309,7 @@ class PeriodicTaskManager:
             logger.error(f"Error removing job {task_id} from scheduler: {e}")
 
     def get_tasks_for_user(self, user_id: str) -> List[Dict[str, Any]]:
-        return [task for task in self.tasks if task.get("user_id") == user_id]
+        return list(self._by_user.get(user_id, []))
 
 # 全局调度器实例
 scheduler_manager = PeriodicTaskManager()
@@ -10,11 +10,18 @@ from websockets.asyncio.client import ClientConnection
 from websockets.protocol import State
 import jwt
 import asyncio
+from functools import lru_cache
 import os
 import time
 import enum
 from rich import print
 
+# orjson 解析速度远快于标准库，未安装时自动退回 response.json()
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # --- 枚举类型，增强代码可读性和健壮性 ---
 class UserSex(enum.IntEnum):
     """用户性别"""
@@ -53,7 +60,10 @@ class AuthenticationError(SevenMateError):
     pass
 
 # --- 数据类 ---
-@dataclass(init=False)
+# slots=True 去掉实例 __dict__，构造更快、单实例内存更小；
+# 周边车辆查询会批量构造这些对象，收益可观。
+# 注意：slots 下类属性默认值不再生效，__init__ 必须为每个字段赋值。
+@dataclass(init=False, slots=True)
 class UserInfo:
     id: int  # 用户唯一标识，例如：1234567
     name: str  # 用户姓名，例如："张三"
@@ -77,18 +87,18 @@ class UserInfo:
     credits: int | None = None  # 用户信用分，例如：100
 
     def __init__(self, **kwargs):
-        for key, value in kwargs.items():
-            if key in self.__annotations__:
-                if key == 'sex' and value is not None:
-                    setattr(self, key, UserSex(value))
-                else:
-                    setattr(self, key, value)
-    
+        for key in self.__annotations__:
+            value = kwargs.get(key)
+            if key == 'sex' and value is not None:
+                value = UserSex(value)
+            setattr(self, key, value)
+
+
     def __iter__(self):
         for key in self.__annotations__:
             yield (key, getattr(self, key))
 
-@dataclass(init=False)
+@dataclass(init=False, slots=True)
 class CarInfo:
     number: str  # 车辆编号，例如："12345678"
     carmodel_id: CarModel  # 车辆型号ID
@@ -102,20 +112,19 @@ class CarInfo:
     allow_temporary_lock: int | None = None  # 是否允许临时锁车，例如：1 允许 0 不允许
 
     def __init__(self, **kwargs):
-        for key, value in kwargs.items():
-            if key in self.__annotations__:
-                if key == 'carmodel_id' and value is not None:
-                    setattr(self, key, CarModel(value))
-                elif key == 'lock_status' and value is not None:
-                    setattr(self, key, LockStatus(value))
-                else:
-                    setattr(self, key, value)
+        for key in self.__annotations__:
+            value = kwargs.get(key)
+            if key == 'carmodel_id' and value is not None:
+                value = CarModel(value)
+            elif key == 'lock_status' and value is not None:
+                value = LockStatus(value)
+            setattr(self, key, value)
 
     def __iter__(self):
         for key in self.__annotations__:
             yield (key, getattr(self, key))
 
-@dataclass(init=False)
+@dataclass(init=False, slots=True)
 class CyclingOrderInfo:
     order_id: int
     car_number: str
@@ -130,27 +139,43 @@ class CyclingOrderInfo:
     created_at: str
 
     def __init__(self, **kwargs):
-        for key, value in kwargs.items():
-            if key in self.__annotations__:
-                if key == 'carmodel_id' and value is not None:
-                    setattr(self, key, CarModel(value))
-                elif key == 'order_state' and value is not None:
-                    setattr(self, key, OrderState(value))
-                else:
-                    setattr(self, key, value)
-    
+        for key in self.__annotations__:
+            value = kwargs.get(key)
+            if key == 'carmodel_id' and value is not None:
+                value = CarModel(value)
+            elif key == 'order_state' and value is not None:
+                value = OrderState(value)
+            setattr(self, key, value)
+
+
     def __iter__(self):
         for key in self.__annotations__:
             yield (key, getattr(self, key))
 
 # --- WebSocket 客户端 ---
+# 预编译的包头格式（大端序三个 4 字节无符号整数），避免每帧重新解析格式串
+_PACKET_HEADER = struct.Struct('>III')
+
 class SevenMateSocketClient:
+    # 指令载荷中不变的请求头部分，类加载时构造一次，所有指令共用
+    _COMMAND_HEADERS = {
+        "Accept": "application/vnd.ws.v1+json",
+        "Client": "Wechat_MiniAPP",
+        "Phone-Model": "Mac14,15",
+        "Phone-Brand": "apple",
+        "Phone-System": "Android",
+        "Phone-System-Version": "Mac OS X 15.6.1 arm64",
+        "App-Version": "1.3.129"
+    }
+
     def __init__(self, user_id, socket_key, socket_url):
         self.user_id = user_id
         self.socket_key = socket_key
         self.uri = f"{socket_url}?sid={self.user_id}"
         self.websocket: ClientConnection | None = None
         self.msg_id_counter = 1
+        self._auth_future: asyncio.Future | None = None
+        self._recv_task: asyncio.Task | None = None
 
     def _calculate_auth_code(self):
         """根据socketKey计算auth_code"""
@@ -159,11 +184,12 @@ class SevenMateSocketClient:
             if len(key_bytes) != 16:
                 raise ValueError("Socket key must be 16 bytes (32 hex chars)")
             
-            auth_bytes = bytearray(16)
-            for i in range(len(key_bytes) - 1):
-                auth_bytes[i] = key_bytes[i] ^ key_bytes[i + 1]
-            auth_bytes[15] = key_bytes[15] ^ auth_bytes[0]
-            
+            # 整个 128 位异或一次完成：key ^ 循环左移一字节的 key，
+            # 等价于逐字节 auth[i] = key[i] ^ key[i+1]；末字节单独修正为 key[15] ^ auth[0]
+            xored = int.from_bytes(key_bytes, 'big') ^ int.from_bytes(key_bytes[1:] + key_bytes[:1], 'big')
+            auth_bytes = bytearray(xored.to_bytes(16, 'big'))
+            auth_bytes[15] ^= key_bytes[1]
+
             return base64.b64encode(auth_bytes).decode('utf-8')
         except Exception as e:
             print(f"计算 auth_code 时出错: {e}")
@@ -175,7 +201,7 @@ class SevenMateSocketClient:
         assert packed_data is not None
         # 头部使用大端序 (>)
         # I = 4-byte unsigned integer
-        header = struct.pack('>III', self.msg_id_counter, action_id, len(packed_data))
+        header = _PACKET_HEADER.pack(self.msg_id_counter, action_id, len(packed_data))
         self.msg_id_counter += 1
         return header + packed_data
 
@@ -195,23 +221,43 @@ class SevenMateSocketClient:
             await self.close()
             raise AuthenticationError("无法生成 auth_code。")
 
+        # 先挂好接收循环再发认证包，确保不会错过服务器的认证应答
+        self._auth_future = asyncio.get_running_loop().create_future()
+        self._recv_task = asyncio.create_task(self._recv_loop())
         auth_payload = {"data": {"auth_code": auth_code}}
         await self._send_packet(action_id=1, data_payload=auth_payload)
 
+    async def _recv_loop(self):
+        """后台接收循环：解析帧头，收到认证应答（action_id=1）时唤醒等待方。"""
+        try:
+            async for frame in self.websocket:
+                if isinstance(frame, str) or len(frame) < 12:
+                    continue
+                _msg_id, action_id, _length = _PACKET_HEADER.unpack_from(frame)
+                if action_id == 1 and self._auth_future and not self._auth_future.done():
+                    self._auth_future.set_result(True)
+        except Exception:
+            # 连接关闭或读帧异常时结束接收循环
+            pass
+
+    async def wait_authenticated(self, timeout: float = 2.0):
+        """
+        等待服务器的认证应答，一般在几十毫秒内到达。
+        超时则按认证已完成继续，行为等同于之前的固定等待。
+        """
+        if self._auth_future is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(self._auth_future), timeout)
+        except asyncio.TimeoutError:
+            pass
+
     async def unlock_car(self):
         """发送解锁车辆的指令"""
         payload = {
             "user_id": self.user_id,
             "scene": {"fn": str(uuid.uuid4()), "showMessage": True},
-            "headers": {
-                "Accept": "application/vnd.ws.v1+json",
-                "Client": "Wechat_MiniAPP",
-                "Phone-Model": "Mac14,15",
-                "Phone-Brand": "apple",
-                "Phone-System": "Android",
-                "Phone-System-Version": "Mac OS X 15.6.1 arm64",
-                "App-Version": "1.3.129"
-            },
+            "headers": self._COMMAND_HEADERS,
             "data": {
                 "action_type": 1
             }
@@ -223,15 +269,7 @@ class SevenMateSocketClient:
         payload = {
             "user_id": self.user_id,
             "scene": {"fn": str(uuid.uuid4()), "showMessage": True},
-            "headers": {
-                "Accept": "application/vnd.ws.v1+json",
-                "Client": "Wechat_MiniAPP",
-                "Phone-Model": "Mac14,15",
-                "Phone-Brand": "apple",
-                "Phone-System": "Android",
-                "Phone-System-Version": "Mac OS X 15.6.1 arm64",
-                "App-Version": "1.3.129"
-            },
+            "headers": self._COMMAND_HEADERS,
             "data": {
                 "back_type": None,
                 "action_type": 1
@@ -241,12 +279,65 @@ class SevenMateSocketClient:
 
     async def close(self):
         """关闭连接"""
+        if self._recv_task:
+            self._recv_task.cancel()
+            self._recv_task = None
         if self.websocket:
             await self.websocket.close()
 
+# HTTP/2 可将同一域名下的并发小请求复用到单条连接上；h2 未安装时退回 HTTP/1.1
+try:
+    import h2  # noqa: F401
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+# --- 进程级共享 HTTP 连接池 ---
+# 所有 SevenPaceAsyncClient 实例默认复用同一个连接池，
+# keepalive 连接在调用之间保持热连接，避免每次实例化都重新 TCP+TLS 握手
+_shared_client: httpx.AsyncClient | None = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """获取共享的 httpx.AsyncClient，首次调用时创建。"""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = httpx.AsyncClient(
+            http2=_HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=100,
+                max_keepalive_connections=20,
+                keepalive_expiry=300
+            ),
+            timeout=httpx.Timeout(connect=5, read=15, write=15, pool=5)
+        )
+    return _shared_client
+
+async def close_shared_client():
+    """关闭共享连接池（应用关闭时调用一次）。"""
+    global _shared_client
+    if _shared_client is not None:
+        await _shared_client.aclose()
+        _shared_client = None
+
+@lru_cache(maxsize=512)
+def _decode_token(token: str) -> tuple[str, str, float]:
+    """解码 JWT 并按 token 缓存结果，重复 set_token 同一 token 时无需重新解析。"""
+    try:
+        payload = jwt.decode(token, options={"verify_signature": False})
+    except jwt.exceptions.DecodeError as e:
+        raise AuthenticationError(f"无效的Token: {e}")
+    exp_timestamp = payload.get("exp", 0)
+    expired_at = datetime.fromtimestamp(exp_timestamp).strftime("%Y-%m-%d %H:%M:%S")
+    return f"Bearer {token}", expired_at, exp_timestamp
+
 # --- 异步 HTTP 客户端 (httpx) ---
 class SevenPaceAsyncClient:
-    def __init__(self, authorization: str | None = None, expired_at: str = ""):
+    def __init__(self, authorization: str | None = None, expired_at: str = "",
+                 http: httpx.AsyncClient | None = None):
+        """
+        :param http: 可选的外部 httpx.AsyncClient。不传时使用进程级共享连接池；
+                     两种情况下 close() 都不会关闭底层客户端。
+        """
         self.base_url = "https://newmapi.7mate.cn/api/"
         self.headers = {
             # "phone-model": "Mac14,15", # 该字段会导致设备限制
@@ -268,22 +359,23 @@ class SevenPaceAsyncClient:
         }
         if authorization:
             self.headers["authorization"] = authorization
+            self.token = authorization[7:] if authorization.startswith("Bearer ") else authorization
+        else:
+            self.token = None
         self.expired_at = expired_at
-        self.http_client = httpx.AsyncClient()
+        # Token 过期时间戳（epoch 秒），set_token 时从 JWT 的 exp 字段解出
+        self.expired_at_ts: float = 0
+        self.http_client = http if http is not None else get_http_client()
+        # 复用的 WebSocket 连接，首次下发指令时懒建立
+        self._ws: SevenMateSocketClient | None = None
 
     def set_token(self, token: str, expired_at: str | None = ""):
         """设置认证令牌"""
-        try:
-            payload = jwt.decode(token, options={"verify_signature": False})
-        except jwt.exceptions.DecodeError as e:
-            raise AuthenticationError(f"无效的Token: {e}")
-        
-        self.headers["authorization"] = f"Bearer {token}"
-        if not expired_at:
-            exp_timestamp = payload.get("exp", 0)
-            self.expired_at = datetime.fromtimestamp(exp_timestamp).strftime("%Y-%m-%d %H:%M:%S")
-        else:
-            self.expired_at = expired_at
+        auth_header, decoded_expired_at, exp_timestamp = _decode_token(token)
+        self.token = token
+        self.headers["authorization"] = auth_header
+        self.expired_at = expired_at if expired_at else decoded_expired_at
+        self.expired_at_ts = exp_timestamp
 
     async def _request(self, method: str, endpoint: str, **kwargs):
         """通用请求方法"""
@@ -291,9 +383,11 @@ class SevenPaceAsyncClient:
         response = await self.http_client.request(method, url, headers=self.headers, **kwargs)
         
         if response.status_code >= 400:
-            raise APIError(f"请求失败，状态码: {response.status_code}, 内容: {response.text}")
+            # 只取前 512 字节原始内容，不为拼错误信息而整段解码（可能是大段 HTML）
+            raise APIError(f"请求失败，状态码: {response.status_code}, 内容: {response.content[:512]!r}")
         
-        json_response = response.json()
+        # .content 是原始字节，orjson 直接解析，省掉 response.json() 的编码探测开销
+        json_response = orjson.loads(response.content) if orjson else response.json()
         if "status_code" in json_response and json_response["status_code"] != 200:
             raise APIError(json_response.get("message", "未知的API错误"))
             
@@ -310,7 +404,7 @@ class SevenPaceAsyncClient:
         data = {"phone": phone, "verification_code": code}
         response = await self.http_client.post(f"{self.base_url}authorizations", json=data, headers=self.headers)
         response.raise_for_status()
-        json_res = response.json()
+        json_res = orjson.loads(response.content) if orjson else response.json()
         if "status_code" in json_res:
             raise APIError(json_res.get("message"))
         
@@ -382,27 +476,30 @@ class SevenPaceAsyncClient:
         response = await self._request("POST", "order", json=data)
         return response.get("message")
 
-    async def unlock_car(self):
-        """解锁车辆（通过WebSocket）"""
+    async def _ensure_ws(self) -> SevenMateSocketClient:
+        """
+        获取可用的 WebSocket 连接：首次调用时查询连接信息并完成认证，
+        之后的指令复用同一连接，连接断开时自动重连。
+        """
+        if (self._ws is not None and self._ws.websocket is not None
+                and self._ws.websocket.state == State.OPEN):
+            return self._ws
         ws_info = await self.get_ws_connection_info()
         ws_client = SevenMateSocketClient(ws_info.get("sid"), ws_info.get("socket_key"), ws_info.get("socket_url"))
-        try:
-            await ws_client.connect()
-            await asyncio.sleep(0.2)  # 等待认证完成
-            await ws_client.unlock_car()
-        finally:
-            await ws_client.close()
+        await ws_client.connect()
+        await ws_client.wait_authenticated()
+        self._ws = ws_client
+        return ws_client
+
+    async def unlock_car(self):
+        """解锁车辆（通过WebSocket，连接在多次指令间复用）"""
+        ws_client = await self._ensure_ws()
+        await ws_client.unlock_car()
 
     async def temporary_lock_car(self):
-        """临时锁车（通过WebSocket）"""
-        ws_info = await self.get_ws_connection_info()
-        ws_client = SevenMateSocketClient(ws_info.get("sid"), ws_info.get("socket_key"), ws_info.get("socket_url"))
-        try:
-            await ws_client.connect()
-            await asyncio.sleep(0.2)  # 等待认证完成
-            await ws_client.temporary_lock_car()
-        finally:
-            await ws_client.close()
+        """临时锁车（通过WebSocket，连接在多次指令间复用）"""
+        ws_client = await self._ensure_ws()
+        await ws_client.temporary_lock_car()
 
     async def temporary_lock_car_http(self) -> str:
         """临时锁车（通过HTTP）"""
@@ -416,11 +513,41 @@ class SevenPaceAsyncClient:
         response = await self._request("POST", "car/lock", json=data)
         return response.get("data", {}).get("cmd")
 
-    async def get_surrounding_cars(self, longitude: float, latitude: float) -> list[CarInfo]:
-        """获取周围车辆（只能拿到车辆编号，车辆类型，车辆位置这几个信息"""
+    async def back_car_with_retry(self, max_retries: int = 12, backoff: float = 15,
+                                  stop_event: asyncio.Event | None = None) -> str:
+        """
+        还车，失败时按固定间隔重试，重试全部用完后抛出 APIError。
+        :param stop_event: 可选的停止事件；在重试等待期间被触发时立即放弃重试。
+        """
+        last_error: APIError | None = None
+        for attempt in range(max_retries):
+            try:
+                return await self.back_car()
+            except APIError as e:
+                last_error = e
+                if attempt == max_retries - 1:
+                    break
+                if stop_event is None:
+                    await asyncio.sleep(backoff)
+                else:
+                    try:
+                        await asyncio.wait_for(stop_event.wait(), timeout=backoff)
+                        break  # 收到停止信号，放弃剩余重试
+                    except asyncio.TimeoutError:
+                        pass
+        raise APIError(f"还车失败（已尝试 {max_retries} 次）: {last_error}")
+
+    async def get_surrounding_cars(self, longitude: float, latitude: float,
+                                   carmodel_id: int | None = None) -> list[CarInfo]:
+        """
+        获取周围车辆（只能拿到车辆编号，车辆类型，车辆位置这几个信息。
+        :param carmodel_id: 可选的车辆型号过滤，在原始数据上过滤，不符合的不构造 CarInfo。
+        """
         params = {"longitude": longitude, "latitude": latitude}
         response = await self._request("GET", "surrounding/car", params=params)
         car_list_data = response.get("data", [])
+        if carmodel_id is not None:
+            return [CarInfo(**car) for car in car_list_data if car.get("carmodel_id") == carmodel_id]
         return [CarInfo(**car) for car in car_list_data]
 
     async def get_car_info(self, car_number: str, need_location=True) -> CarInfo:
@@ -479,8 +606,10 @@ class SevenPaceAsyncClient:
         return response.get("data", {}).get("desc")
 
     async def close(self):
-        """关闭HTTP客户端"""
-        await self.http_client.aclose()
+        """关闭本实例持有的 WebSocket 连接；共享 HTTP 连接池由 close_shared_client 统一关闭"""
+        if self._ws is not None:
+            await self._ws.close()
+            self._ws = None
 
 async def main():
     client = SevenPaceAsyncClient()
@@ -612,7 +741,7 @@ async def main():
         #     print(f"[bold red]签到失败:[/bold red] {e}")
 
     finally:
-        await client.close()
+        await close_shared_client()
 
 if __name__ == "__main__":
     asyncio.run(main())